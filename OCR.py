@@ -1,5 +1,198 @@
 from PIL import Image
-import pytesseract
+import atexit
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+# The OCR backends are imported on first use, so importing this module (and
+# a Streamlit cold start) does not pay for them unless a page is processed.
+# None means not resolved yet, False means tesserocr is not available.
+_tesserocr = None
+_tesserocr_lock = threading.Lock()
+# Per thread: whether tesserocr cannot be imported there (see
+# _load_tesserocr), and the thread's Tesseract instance. Each thread keeps its
+# own instance, created on first use, so threads read crops in parallel
+# (tesserocr releases the GIL) and none of them spawns a tesseract subprocess
+# or reloads tessdata for every crop.
+_thread_state = threading.local()
+
+# Crops shorter than this are upscaled before OCR
+OCR_TARGET_HEIGHT = 130
+# Crops taller than this (pages rendered well above 300 DPI) are scaled down
+# to OCR_TARGET_HEIGHT. Tesseract's cost grows with the pixel count, and a
+# single short line reads just as well at the target height.
+OCR_MAX_HEIGHT = 2 * OCR_TARGET_HEIGHT
+
+# Protection IDs only use these characters, restricting Tesseract to them
+# narrows its search and avoids lookalike punctuation
+SUOJA_CHAR_WHITELIST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789/'
+
+# Text of recently read crops, keyed by their pixel content. The same suoja
+# cell tends to repeat down a page, so most crops are read only once.
+_OCR_CACHE_SIZE = 1024
+_ocr_cache = OrderedDict()
+# Streamlit sessions share the cache from their own threads
+_ocr_cache_lock = threading.Lock()
+
+# OCR worker processes, started on first use and kept for the life of the
+# process so each worker loads Tesseract once for all pages, not once per page.
+# Workers run Tesseract single threaded, so by default there is one per core.
+_ocr_workers = os.cpu_count() or 1
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _load_tesserocr():
+    global _tesserocr
+
+    if getattr(_thread_state, 'no_tesserocr', False):
+        return None
+
+    # The lock makes concurrent first calls agree on one backend
+    with _tesserocr_lock:
+        if _tesserocr is None:
+            try:
+                import tesserocr
+            except ImportError:
+                _tesserocr = False  # Not installed
+            except ValueError:
+                # tesserocr sets up signal handlers, which only works in the
+                # main thread, and Streamlit runs scripts in a worker thread.
+                # Only this thread goes without it, the main thread (e.g. an
+                # OCR worker process) can still load it.
+                _thread_state.no_tesserocr = True
+                return None
+            else:
+                _tesserocr = tesserocr
+        return _tesserocr or None
+
+
+def get_api():
+    """
+    Returns the Tesseract instance of the calling thread, creating it on first use.
+
+    Returns:
+        PyTessBaseAPI: The thread's instance, or None when tesserocr is not
+                       installed or cannot load its tessdata, and OCR goes
+                       through pytesseract instead
+    """
+    global _tesserocr
+
+    tesserocr = _load_tesserocr()
+    if tesserocr is None:
+        return None
+
+    api = getattr(_thread_state, 'api', None)
+    if api is None:
+        try:
+            # LSTM only, so the legacy engine's classifier is never loaded
+            api = tesserocr.PyTessBaseAPI(
+                lang='eng',
+                psm=tesserocr.PSM.SINGLE_LINE,
+                oem=tesserocr.OEM.LSTM_ONLY,
+            )
+        except RuntimeError:
+            # tesserocr could not find its tessdata (e.g. a pip wheel that
+            # looks in "./"), the tesseract binary may still find its own
+            with _tesserocr_lock:
+                _tesserocr = False
+            return None
+        api.SetVariable('tessedit_char_whitelist', SUOJA_CHAR_WHITELIST)
+        _thread_state.api = api
+    return api
+
+
+def _image_to_string(img, whitelist=SUOJA_CHAR_WHITELIST):
+    api = get_api()
+
+    # Fall back to the pytesseract subprocess when tesserocr is not installed
+    if api is None:
+        import pytesseract
+
+        return pytesseract.image_to_string(
+            img,
+            lang='eng',
+            config=f'--oem 1 --psm 7 -c tessedit_char_whitelist={whitelist}',
+        )
+
+    # The instance belongs to this thread, no other thread uses it
+    api.SetVariable('tessedit_char_whitelist', whitelist)
+    api.SetImage(img)
+    return api.GetUTF8Text()
+
+
+def read_text_line(img, whitelist=SUOJA_CHAR_WHITELIST):
+    """
+    Reads a single line of text from an image with the shared Tesseract instance.
+
+    Args:
+        img (PIL.Image.Image): Image containing one line of text
+        whitelist (str): Characters Tesseract is allowed to recognize
+
+    Returns:
+        str: The recognized text, stripped of leading/trailing whitespace
+    """
+    return _image_to_string(img, whitelist).strip()
+
+
+@lru_cache(maxsize=4)
+def _open_cached(file_path, mtime):
+    # mtime is part of the cache key so a rewritten file is decoded again.
+    # Crops are read in grayscale, so JPEGs are decoded straight to it.
+    img = Image.open(file_path)
+    img.draft('L', img.size)
+    img.load()
+    return img
+
+
+def _open_image(image):
+    # Accept an already decoded image or a path to one
+    if isinstance(image, Image.Image):
+        return image
+    return _open_cached(image, os.path.getmtime(image))
+
+
+def _crop_key(cropped_img):
+    digest = hashlib.blake2b(cropped_img.tobytes(), digest_size=16).digest()
+    return cropped_img.mode, cropped_img.size, digest
+
+
+def _cached_text(key):
+    with _ocr_cache_lock:
+        text = _ocr_cache.get(key)
+        if text is not None:
+            _ocr_cache.move_to_end(key)
+        return text
+
+
+def _remember_text(key, text):
+    # Errors are not cached so the crop is retried next time
+    if text.startswith('Error:'):
+        return
+    with _ocr_cache_lock:
+        _ocr_cache[key] = text
+        if len(_ocr_cache) > _OCR_CACHE_SIZE:
+            _ocr_cache.popitem(last=False)
+
+
+def _preprocess_for_ocr(cropped_img):
+    # Tesseract works best on grayscale text with a reasonable x-height
+    img = cropped_img.convert('L')
+
+    # Upscale small crops and downscale oversized ones, crops in between are
+    # left as they are
+    if 0 < img.height < OCR_TARGET_HEIGHT:
+        new_width = int(img.width * OCR_TARGET_HEIGHT / img.height)
+        img = img.resize((new_width, OCR_TARGET_HEIGHT), Image.BILINEAR)
+    elif img.height > OCR_MAX_HEIGHT:
+        new_width = max(1, int(img.width * OCR_TARGET_HEIGHT / img.height))
+        img = img.resize((new_width, OCR_TARGET_HEIGHT), Image.LANCZOS)
+
+    return img
 
 
 def ocr_read_area(file_path, area, debug=False, debug_output='debug_crop.png'):
@@ -7,7 +200,8 @@ def ocr_read_area(file_path, area, debug=False, debug_output='debug_crop.png'):
     Reads text from a specific area of an image using OCR.
 
     Args:
-        file_path (str): Path to the image file
+        file_path (str or PIL.Image.Image): Path to the image file, or an
+                    already opened image
         area (dict): Dictionary with keys 'x_start', 'x_end', 'y_start', 'y_end'
                     defining the rectangular area to OCR
         debug (bool): If True, saves the cropped area as an image file
@@ -22,8 +216,8 @@ def ocr_read_area(file_path, area, debug=False, debug_output='debug_crop.png'):
         print(text)
     """
     try:
-        # Open the image
-        img = Image.open(file_path)
+        # Open the image (decoded pages are cached between calls)
+        img = _open_image(file_path)
 
         # Extract the coordinates
         x_start = area['x_start']
@@ -34,17 +228,26 @@ def ocr_read_area(file_path, area, debug=False, debug_output='debug_crop.png'):
         # Crop the image to the specified area
         # PIL uses (left, top, right, bottom) format
         cropped_img = img.crop((x_start, y_start, x_end, y_end))
+        key = _crop_key(cropped_img)
+        cropped_img = _preprocess_for_ocr(cropped_img)
 
         # Save debug image if requested
         if debug:
             cropped_img.save(debug_output)
             print(f"Debug: Cropped area saved to '{debug_output}'")
 
+        # Reuse the text of an identical crop read earlier
+        text = _cached_text(key)
+        if text is not None:
+            return text
+
         # Perform OCR on the cropped area
-        text = pytesseract.image_to_string(cropped_img)
+        text = _image_to_string(cropped_img)
 
         # Return the text, stripped of leading/trailing whitespace
-        return text.strip()
+        text = text.strip()
+        _remember_text(key, text)
+        return text
 
     except FileNotFoundError:
         return f"Error: File '{file_path}' not found"
@@ -54,6 +257,207 @@ def ocr_read_area(file_path, area, debug=False, debug_output='debug_crop.png'):
         return f'Error: {str(e)}'
 
 
+def _init_worker():
+    global _tesserocr, _thread_state
+
+    # Each worker process builds its own Tesseract instance on first use. The
+    # backend is resolved again too, since workers run tasks on their main
+    # thread and may load tesserocr where the parent could not. A worker
+    # forked from another thread would otherwise keep that thread's state and
+    # instance.
+    _tesserocr = None
+    _thread_state = threading.local()
+
+    # Tesseract's OpenMP threads only add contention when every core already
+    # runs a worker. Set before Tesseract is loaded in this worker, and
+    # inherited by pytesseract's tesseract subprocesses.
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+
+def set_ocr_workers(max_workers):
+    """
+    Sets how many worker processes OCR batches are spread over.
+
+    Args:
+        max_workers (int): Number of OCR workers, 1 runs OCR in this process.
+                           Useful when the caller already runs one process per
+                           core, e.g. one per page.
+    """
+    global _ocr_workers
+
+    with _pool_lock:
+        _ocr_workers = max(1, max_workers)
+        _shutdown_pool()
+
+
+def _shutdown_pool():
+    # Called with _pool_lock held, or at exit
+    global _pool
+
+    if _pool is not None:
+        _pool.shutdown(wait=False)
+        _pool = None
+
+
+# One exit handler for whichever pool is current, not one per pool
+atexit.register(_shutdown_pool)
+
+
+def _get_pool():
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=_ocr_workers, initializer=_init_worker
+            )
+        return _pool
+
+
+def _discard_pool(pool):
+    # Another thread may already have replaced the broken pool
+    with _pool_lock:
+        if _pool is pool:
+            _shutdown_pool()
+
+
+def _read_on_pool(shares):
+    # A worker that dies (killed, or crashed inside Tesseract) breaks the whole
+    # pool, so it is replaced and the batch tried once more on a fresh one
+    for _ in range(2):
+        pool = _get_pool()
+        try:
+            return [text for share in pool.map(_ocr_crops, shares) for text in share]
+        except BrokenProcessPool:
+            _discard_pool(pool)
+    return None
+
+
+def _ocr_crop(cropped_img):
+    try:
+        return _image_to_string(_preprocess_for_ocr(cropped_img)).strip()
+    except Exception as e:
+        return f'Error: {str(e)}'
+
+
+def _tesseract_batch(images, whitelist=SUOJA_CHAR_WHITELIST):
+    import subprocess
+    import tempfile
+
+    import pytesseract
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_paths = []
+        for i, img in enumerate(images):
+            image_path = os.path.join(tmp_dir, f'crop_{i}.png')
+            img.save(image_path)
+            image_paths.append(image_path)
+
+        # Tesseract reads every image listed in a text file in one run
+        list_path = os.path.join(tmp_dir, 'crops.txt')
+        with open(list_path, 'w') as list_file:
+            list_file.write('\n'.join(image_paths))
+
+        output = subprocess.run(
+            [
+                pytesseract.pytesseract.tesseract_cmd,
+                list_path,
+                'stdout',
+                '-l',
+                'eng',
+                '--oem',
+                '1',
+                '--psm',
+                '7',
+                '-c',
+                f'tessedit_char_whitelist={whitelist}',
+            ],
+            capture_output=True,
+            check=True,
+        ).stdout.decode('utf-8')
+
+    # The text of each image ends with a form feed page separator
+    texts = output.split('\f')
+    if len(texts) < len(images):
+        raise RuntimeError('Tesseract returned fewer results than images')
+    return texts[: len(images)]
+
+
+def _ocr_crops(crops):
+    # Without tesserocr every pytesseract call starts a tesseract process and
+    # loads the model again, so read all crops in a single tesseract run instead
+    if len(crops) > 1 and get_api() is None:
+        try:
+            images = [_preprocess_for_ocr(crop) for crop in crops]
+            return [text.strip() for text in _tesseract_batch(images)]
+        except Exception:
+            pass  # Read the crops one by one, reporting errors per crop
+
+    return [_ocr_crop(crop) for crop in crops]
+
+
+def ocr_read_areas(file_path, areas):
+    """
+    Reads text from several areas of the same image using a pool of OCR workers.
+
+    Args:
+        file_path (str or PIL.Image.Image): Path to the image file, or an
+                    already opened image
+        areas (list): Area dictionaries with keys 'x_start', 'x_end', 'y_start',
+                      'y_end', as accepted by ocr_read_area
+
+    Returns:
+        list: The text extracted from each area, in the same order as areas
+    """
+    try:
+        # Decode the image once and crop every area from it
+        img = _open_image(file_path)
+
+        crops = [
+            img.crop((area['x_start'], area['y_start'], area['x_end'], area['y_end']))
+            for area in areas
+        ]
+    except FileNotFoundError:
+        return [f"Error: File '{file_path}' not found"] * len(areas)
+    except KeyError as e:
+        return [f'Error: Missing required key in area dictionary: {e}'] * len(areas)
+    except Exception as e:
+        return [f'Error: {str(e)}'] * len(areas)
+
+    # Only OCR crops that were not read before, and each distinct crop once
+    keys = [_crop_key(crop) for crop in crops]
+    texts = {}
+    pending = {}
+    for key, crop in zip(keys, crops):
+        text = _cached_text(key)
+        if text is not None:
+            texts[key] = text
+        elif key not in texts:
+            pending.setdefault(key, crop)
+
+    # Each worker gets one contiguous share of the crops
+    pending_crops = list(pending.values())
+    workers = min(len(pending_crops), _ocr_workers)
+
+    if workers <= 1:
+        results = _ocr_crops(pending_crops)
+    else:
+        size = -(-len(pending_crops) // workers)
+        shares = [
+            pending_crops[i : i + size] for i in range(0, len(pending_crops), size)
+        ]
+        results = _read_on_pool(shares)
+        if results is None:
+            # The workers keep dying, read the crops in this process instead
+            results = _ocr_crops(pending_crops)
+
+    for key, text in zip(pending, results):
+        texts[key] = text
+        _remember_text(key, text)
+
+    return [texts[key] for key in keys]
+
+
 # Example usage
 if __name__ == '__main__':
     # Define the area to read
@@ -1,9 +1,14 @@
 import streamlit as st
+import atexit
+import io
 import tempfile
 import os
 import shutil
-from pdf2image import pdfinfo_from_path
-from pdf_to_jpeg import convert_pdf_to_images
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+from pdf_to_jpeg import count_pdf_pages, render_pdf_page_from_path
 from make_comparisons import compare_components
 from extract_components import do_extraction
 
@@ -44,6 +49,131 @@ if 'total_pages' not in st.session_state:
     st.session_state.total_pages = None
 if 'last_uploaded_file' not in st.session_state:
     st.session_state.last_uploaded_file = None
+if 'page_cache' not in st.session_state:
+    st.session_state.page_cache = {}
+if 'workdir' not in st.session_state:
+    st.session_state.workdir = None
+if 'tmp_path' not in st.session_state:
+    st.session_state.tmp_path = None
+if 'render_futures' not in st.session_state:
+    st.session_state.render_futures = {}
+if 'render_lock' not in st.session_state:
+    st.session_state.render_lock = threading.Lock()
+
+
+@st.cache_resource
+def get_render_pool():
+    # Pages are rendered in worker processes from the file path, since pdfium
+    # is not thread safe and must not share a document between workers
+    return ProcessPoolExecutor(max_workers=2)
+
+
+def submit_render(page_number):
+    # The lock keeps the same page from being submitted twice
+    with st.session_state.render_lock:
+        futures = st.session_state.render_futures
+        if page_number not in futures:
+            futures[page_number] = get_render_pool().submit(
+                render_pdf_page_from_path, st.session_state.tmp_path, page_number
+            )
+        return futures[page_number]
+
+
+def reset_render_pool():
+    # A worker that crashed (pdfium can, on a bad PDF) breaks the cached pool
+    # for every session, so start a new one and drop this session's futures
+    get_render_pool.clear()
+    with st.session_state.render_lock:
+        st.session_state.render_futures.clear()
+
+
+def render_page(page_number):
+    try:
+        return submit_render(page_number).result()
+    except BrokenProcessPool:
+        reset_render_pool()
+        return submit_render(page_number).result()
+
+
+def prefetch_pages(page_numbers, total_pages):
+    # Render neighbouring pages in the background while the user looks at this
+    # one. Navigation starts at page 2, so page 1 is never rendered.
+    for page_number in page_numbers:
+        if (
+            2 <= page_number <= total_pages
+            and page_number not in st.session_state.page_cache
+        ):
+            try:
+                submit_render(page_number)
+            except BrokenProcessPool:
+                reset_render_pool()
+                return  # The selected page is rendered again when analyzed
+
+
+@st.cache_resource
+def get_live_workdirs():
+    # The current work directory of every session. A single exit handler per
+    # server process removes whatever is still in it.
+    workdirs = set()
+    atexit.register(remove_workdirs, workdirs)
+    return workdirs
+
+
+def remove_workdirs(workdirs):
+    for path in list(workdirs):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def remove_workdir(path):
+    if path is not None:
+        shutil.rmtree(path, ignore_errors=True)
+        get_live_workdirs().discard(path)
+
+
+# Component images are shown in a column about this wide
+THUMBNAIL_SIZE = (540, 540)
+
+
+def thumbnail_bytes(image):
+    # Downscale and encode once, so reruns send small ready-made JPEGs
+    thumbnail = image.copy()
+    thumbnail.thumbnail(THUMBNAIL_SIZE)
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, 'JPEG', quality=80)
+    return buffer.getvalue()
+
+
+def analyze_page(page_number):
+    # Render the selected page in memory, or pick up the prefetched render.
+    # The future is dropped even when the render failed, so the next rerun
+    # renders the page again instead of re-raising the old error.
+    try:
+        page_image = render_page(page_number)
+    finally:
+        with st.session_state.render_lock:
+            st.session_state.render_futures.pop(page_number, None)
+
+    # The components stay in memory, nothing is written to disk
+    (cell_images, component_with_suoja) = do_extraction(page_image, components_dir=None)
+
+    num_cells = len(cell_images)
+    rows = []
+
+    if component_with_suoja and num_cells > 0:
+        unique_components = compare_components(component_with_suoja, cell_images)
+
+        images = dict(zip(component_with_suoja, cell_images))
+        rows = [
+            (thumbnail_bytes(images[filename]), label, count)
+            for (filename, label), count in unique_components.items()
+        ]
+
+    # Sorted once here, reruns only iterate over the cached frame
+    results = pd.DataFrame(rows, columns=['image', 'label', 'count'])
+    results = results.sort_values('count', ascending=False, kind='stable')
+
+    return num_cells, results
+
 
 uploaded_file = st.file_uploader(
     'Upload PDF Document',
@@ -51,21 +181,44 @@ uploaded_file = st.file_uploader(
 )
 
 if uploaded_file is not None:
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-        tmp_file.write(uploaded_file.read())
-        tmp_path = tmp_file.name
+    # Write the upload to disk and get total page count only if file is new or
+    # changed. The file id changes on every upload, even of a file with the
+    # same name, so cached pages never outlive the file they came from.
+    if (
+        st.session_state.tmp_path is None
+        or st.session_state.last_uploaded_file != uploaded_file.file_id
+    ):
+        # All files of this upload live in one temporary directory per session,
+        # removed when the upload is replaced or cleared
+        remove_workdir(st.session_state.workdir)
+        st.session_state.workdir = tempfile.mkdtemp(prefix='invsimp_')
+        # Make sure the directory does not outlive the server process
+        get_live_workdirs().add(st.session_state.workdir)
+
+        st.session_state.tmp_path = os.path.join(st.session_state.workdir, 'upload.pdf')
+        with open(st.session_state.tmp_path, 'wb') as tmp_file:
+            # Stream in 1 MB chunks instead of holding the whole PDF in memory
+            uploaded_file.seek(0)
+            shutil.copyfileobj(uploaded_file, tmp_file, length=1024 * 1024)
 
-    # Get total page count if file is new or changed
-    if st.session_state.last_uploaded_file != uploaded_file.name:
-        st.session_state.last_uploaded_file = uploaded_file.name
+        st.session_state.last_uploaded_file = uploaded_file.file_id
         st.session_state.current_page = 2  # Reset to page 2 for new file
+        st.session_state.page_cache = {}  # Results belong to the previous file
+        st.session_state.render_futures = {}
+
+        # The page count comes from pdfium, no pdfinfo subprocess. The render
+        # workers keep their own open documents for rendering.
         try:
-            pdf_info = pdfinfo_from_path(tmp_path, poppler_path='/opt/homebrew/bin')
-            st.session_state.total_pages = pdf_info.get('Pages', 100)
-        except Exception:
-            st.session_state.total_pages = 100  # Default fallback
+            st.session_state.total_pages = count_pdf_pages(st.session_state.tmp_path)
+        except Exception as e:
+            # Corrupt or encrypted file, forget it so the next rerun does not
+            # show the previous file's pages
+            st.session_state.total_pages = None
+            st.session_state.last_uploaded_file = None
+            st.error(f'Could not open PDF: {str(e)}')
+            st.stop()
 
-    total_pages = st.session_state.total_pages or 100
+    total_pages = st.session_state.total_pages
 
     st.divider()
 
@@ -97,93 +250,78 @@ if uploaded_file is not None:
     page_number = st.session_state.current_page
 
     results_placeholder = st.empty()
+    page_cache = st.session_state.page_cache
+
+    # Start rendering this page and its neighbours, so the renders overlap the
+    # analysis and the next click finds its page ready
+    prefetch_pages((page_number, page_number + 1, page_number - 1), total_pages)
 
-    # Automatically analyze the current page
+    # Automatically analyze the current page, unless it was analyzed already
     with results_placeholder.container():
-        with st.spinner(f'Processing page {page_number}...'):
-            try:
-                # Convert PDF to images (selected page only, outputs to 'pages' directory)
-                convert_pdf_to_images(tmp_path, pages=[page_number])
-
-                # Get the page file
-                page_file = os.path.join('pages', f'page_{page_number}.jpg')
-
-                if not os.path.exists(page_file):
-                    st.error(f'Page {page_number} was not extracted from the PDF')
-                else:
-                    (cell_images, component_with_suoja) = do_extraction(page_file)
-
-                    num_cells = len(cell_images)
-
-                    if component_with_suoja and num_cells > 0:
-                        unique_components = compare_components(component_with_suoja)
-
-                        st.subheader('Summary')
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.metric('Total components', num_cells)
-                        with col2:
-                            st.metric('Total unique components', len(unique_components))
-
-                        # Display unique components with images in table format
-                        if unique_components:
-                            st.markdown('### Results')
-
-                            # Table header
-                            header_col1, header_col2, header_col3 = st.columns(
-                                [3, 1, 1]
-                            )
-                            with header_col1:
-                                st.markdown('**Component**')
-                            with header_col2:
-                                st.markdown('**Protection ID**')
-                            with header_col3:
-                                st.markdown('**Quantity**')
-                            st.markdown('---')
-
-                            # Table rows
-                            for (filename, label), count in sorted(
-                                unique_components.items(),
-                                key=lambda x: x[1],
-                                reverse=True,
-                            ):
-                                col1, col2, col3 = st.columns([3, 1, 1])
-                                with col1:
-                                    # Display the component image
-                                    # filename is already the full path (e.g., 'components/component_01.jpg')
-                                    if os.path.exists(filename):
-                                        st.image(filename, use_container_width=True)
-                                with col2:
-                                    st.markdown(
-                                        f'<p style="font-size: 1.5rem; padding-left: 1.5rem;">{label}</p>',
-                                        unsafe_allow_html=True,
-                                    )
-                                with col3:
-                                    st.markdown(
-                                        f'<p style="font-size: 1.5rem; padding-left: .25rem;">{count}</p>',
-                                        unsafe_allow_html=True,
-                                    )
-                                st.markdown('---')
-                    else:
-                        st.info('No components to compare')
-
-            except Exception as e:
-                st.error(f'Error processing PDF: {str(e)}')
-                import traceback
-
-                st.error(traceback.format_exc())
-
-    # Clean up resources after processing
-    try:
-        for temp_dir in ['pages', 'components', 'extracted_cells']:
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
-    except Exception:
-        pass  # Ignore cleanup errors
+        if page_number not in page_cache:
+            with st.spinner(f'Processing page {page_number}...'):
+                try:
+                    page_cache[page_number] = analyze_page(page_number)
+                except Exception as e:
+                    st.error(f'Error processing PDF: {str(e)}')
+                    import traceback
+
+                    st.error(traceback.format_exc())
+
+        if page_number in page_cache:
+            num_cells, results = page_cache[page_number]
+
+            if not results.empty:
+                st.subheader('Summary')
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.metric('Total components', num_cells)
+                with col2:
+                    st.metric('Total unique components', len(results))
+
+                # Display unique components with images in table format
+                st.markdown('### Results')
+
+                # Table header
+                header_col1, header_col2, header_col3 = st.columns([3, 1, 1])
+                with header_col1:
+                    st.markdown('**Component**')
+                with header_col2:
+                    st.markdown('**Protection ID**')
+                with header_col3:
+                    st.markdown('**Quantity**')
+                st.markdown('---')
+
+                # Table rows
+                for image, label, count in results.itertuples(index=False):
+                    col1, col2, col3 = st.columns([3, 1, 1])
+                    with col1:
+                        # Display the component image
+                        st.image(image, use_container_width=True)
+                    with col2:
+                        st.markdown(
+                            f'<p style="font-size: 1.5rem; padding-left: 1.5rem;">{label}</p>',
+                            unsafe_allow_html=True,
+                        )
+                    with col3:
+                        st.markdown(
+                            f'<p style="font-size: 1.5rem; padding-left: .25rem;">{count}</p>',
+                            unsafe_allow_html=True,
+                        )
+                    st.markdown('---')
+            else:
+                st.info('No components to compare')
 
 else:
+    # The file was removed, release it so uploading it again starts fresh
+    if st.session_state.tmp_path is not None:
+        remove_workdir(st.session_state.workdir)
+        st.session_state.workdir = None
+        st.session_state.tmp_path = None
+        st.session_state.last_uploaded_file = None
+        st.session_state.page_cache = {}
+        st.session_state.render_futures = {}
+
     st.info('Please upload a PDF file to begin analysis')
     st.markdown("""
     ### Instructions
@@ -1,26 +1,66 @@
 import cv2
+import numpy as np
+import os
+from functools import lru_cache
+from PIL import Image
 
-def are_images_different(
-    path_image1: str,
-    path_image2: str,
-    threshold: float = 0.5
-) -> bool:
-    img1 = cv2.imread(path_image1, 0)
-    img2 = cv2.imread(path_image2, 0)
-    
-    orb = cv2.ORB_create()
-    kp1, des1 = orb.detectAndCompute(img1, None)
-    kp2, des2 = orb.detectAndCompute(img2, None)
-    
-    if des1 is None or des2 is None:
-        return True  # If no features detected, consider different
-    
-    bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
-    matches = bf.match(des1, des2)
-    
-    # Calculate match ratio relative to the smaller set of keypoints
-    match_ratio = len(matches) / min(len(kp1), len(kp2))
-    
-    print(f'Matches: {len(matches)}, Keypoints: {len(kp1)}/{len(kp2)}, Ratio: {match_ratio:.2f}')
-    
-    return match_ratio < threshold  # Different if ratio is below threshold
\ No newline at end of file
+# The hash keeps the 8 x 32 lowest DCT frequencies. Components are wide strips
+# that differ in small symbols, a square 8 x 8 hash is too coarse to tell e.g.
+# 1- and 3-phase breakers apart.
+HASH_ROWS = 8
+HASH_COLS = 32
+
+# Hashes of the same component differ in at most this many of their 256 bits
+MAX_HASH_DIFF = 20
+
+def image_hash(image) -> np.ndarray:
+    # Perceptual hash (pHash) of the image as four uint64 words, computed once
+    # per component so comparing two components is an XOR and popcount.
+    # Accepts a path to an image file, a PIL image or a grayscale array.
+    if isinstance(image, (str, os.PathLike)):
+        return _image_hash_cached(image, os.path.getmtime(image))
+    if isinstance(image, Image.Image):
+        image = np.asarray(image.convert('L'))
+    return _gray_hash(image)
+
+@lru_cache(maxsize=1024)
+def _image_hash_cached(path_image: str, mtime: float) -> np.ndarray:
+    # mtime is part of the cache key so a rewritten file is hashed again
+    hash_words = _gray_hash(cv2.imread(path_image, 0))
+    hash_words.flags.writeable = False  # Shared between callers through the cache
+    return hash_words
+
+def _gray_hash(img: np.ndarray) -> np.ndarray:
+    # Trim to the drawn content, so crops of the same component taken at a
+    # slightly different height still hash the same. OpenCV works on the uint8
+    # mask directly, no index arrays of every dark pixel are built.
+    x, y, w, h = cv2.boundingRect(cv2.compare(img, 128, cv2.CMP_LT))
+    if w and h:
+        img = img[y:y + h, x:x + w]
+
+    small = cv2.resize(
+        img, (HASH_COLS * 4, HASH_ROWS * 4), interpolation=cv2.INTER_AREA
+    )
+    dct = cv2.dct(np.float32(small))[:HASH_ROWS, :HASH_COLS]
+    bits = np.packbits(dct > np.median(dct))
+    return bits.view(np.uint64)
+
+def _swar_popcount64(x: np.ndarray) -> np.ndarray:
+    # Set bits of each uint64 word (SWAR popcount), without expanding the words
+    # into one byte per bit like np.unpackbits does
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + (
+        (x >> np.uint64(2)) & np.uint64(0x3333333333333333)
+    )
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+# NumPy 2.0+ has a popcount ufunc that uses the CPU's popcount instruction,
+# older versions fall back to the SWAR version
+popcount64 = getattr(np, 'bitwise_count', _swar_popcount64)
+
+def hash_distances(hashes: np.ndarray) -> np.ndarray:
+    # Number of differing bits between every pair of hashes, as an N x N matrix.
+    # One broadcast XOR instead of a Python call per pair.
+    xor = hashes[:, None, :] ^ hashes[None, :, :]
+    return popcount64(xor).sum(axis=-1, dtype=np.int32)
@@ -1,9 +1,23 @@
 from PIL import Image
 import numpy as np
+import hashlib
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Dict
-from OCR import ocr_read_area
-import pytesseract
+from OCR import ocr_read_areas
+
+# Word boxes of recently read page headers, keyed by the header pixels, so a
+# page processed again (or a page with an identical header) is not read again
+_HEADER_CACHE_SIZE = 64
+_header_cache = OrderedDict()
+_header_cache_lock = threading.Lock()
+
+# Threads writing the component JPEGs of a page. Kept small since main.py
+# already runs one extraction process per core.
+_SAVE_WORKERS = 4
 
 
 def normalize_suoja_value(suoja_value: str) -> str:
@@ -12,10 +26,34 @@ def normalize_suoja_value(suoja_value: str) -> str:
     return suoja_value.strip()
 
 
-def find_component_area(filepath):
-    # Load the image and convert to grayscale
-    img = Image.open(filepath).convert('L')
-    img_array = np.array(img)
+def _as_gray_array(image):
+    # Helpers take the grayscale array decoded once by do_extraction, or a PIL
+    # image when called on their own
+    if isinstance(image, np.ndarray):
+        return image
+    if image.mode != 'L':
+        image = image.convert('L')
+    return np.asarray(image)
+
+
+def _trace_reach(is_black, gap_tolerance):
+    # A trace along is_black stops at the first gap of more than gap_tolerance
+    # non-black pixels. Returns the index of the last black pixel before that
+    # gap, or -1 when there is none.
+    if is_black.size > gap_tolerance:
+        gaps = np.lib.stride_tricks.sliding_window_view(
+            ~is_black, gap_tolerance + 1
+        ).all(axis=1)
+        if gaps.any():
+            is_black = is_black[: np.argmax(gaps)]
+
+    black = np.flatnonzero(is_black)
+    return int(black[-1]) if black.size else -1
+
+
+def find_component_area(image):
+    # Grayscale pixels of the page
+    img_array = _as_gray_array(image)
 
     height, width = img_array.shape
     scan_y = height // 2
@@ -43,33 +81,17 @@ def find_component_area(filepath):
         # Find consecutive black pixels
         is_black = row < BLACK_THRESHOLD
 
-        # Find runs of black pixels
-        bar_start = None
-        bar_width = 0
-
-        for x in range(width):
-            if is_black[x]:
-                if bar_start is None:
-                    bar_start = x
-                bar_width += 1
-            else:
-                # End of a black region
-                if bar_width >= MIN_BAR_WIDTH:
-                    bar_x = bar_start
-                    bar_center_x = bar_start + bar_width // 2
-                    initial_y = current_y
-                    break
-                # Reset for next bar
-                bar_start = None
-                bar_width = 0
-
-        # Check if we ended on a black bar
-        if bar_width >= MIN_BAR_WIDTH:
-            bar_x = bar_start
-            bar_center_x = bar_start + bar_width // 2
-            initial_y = current_y
+        # Find runs of black pixels, they start and end where the mask flips
+        edges = np.diff(is_black.astype(np.int8), prepend=0, append=0)
+        run_starts = np.flatnonzero(edges == 1)
+        run_widths = np.flatnonzero(edges == -1) - run_starts
 
-        if bar_x is not None:
+        # The first run wide enough is the bar
+        wide_runs = np.flatnonzero(run_widths >= MIN_BAR_WIDTH)
+        if wide_runs.size:
+            bar_x = int(run_starts[wide_runs[0]])
+            bar_center_x = bar_x + int(run_widths[wide_runs[0]]) // 2
+            initial_y = current_y
             break
 
     if bar_x is None:
@@ -78,42 +100,24 @@ def find_component_area(filepath):
 
     GAP_TOLERANCE = 1  # Allow this many consecutive non-black pixels before stopping (adjust as needed for noise)
 
+    # Black pixels of the bar's centre column
+    column = img_array[:, bar_center_x] < BLACK_THRESHOLD
+
     # Trace upward (towards smaller y)
-    bar_top = initial_y
-    y = initial_y - 1
-    gap_count = 0
-    while y >= 0:
-        if img_array[y, bar_center_x] < BLACK_THRESHOLD:
-            bar_top = y
-            gap_count = 0
-        else:
-            gap_count += 1
-            if gap_count > GAP_TOLERANCE:
-                break
-        y -= 1
+    reach = _trace_reach(column[:initial_y][::-1], GAP_TOLERANCE)
+    bar_top = initial_y - 1 - reach if reach >= 0 else initial_y
 
     # Trace downward (towards larger y)
-    bar_bottom = initial_y
-    y = initial_y + 1
-    gap_count = 0
-    while y < height:
-        if img_array[y, bar_center_x] < BLACK_THRESHOLD:
-            bar_bottom = y
-            gap_count = 0
-        else:
-            gap_count += 1
-            if gap_count > GAP_TOLERANCE:
-                break
-        y += 1
+    reach = _trace_reach(column[initial_y + 1 :], GAP_TOLERANCE)
+    bar_bottom = initial_y + 1 + reach if reach >= 0 else initial_y
 
     # Now scan rightwards from the top position to find the next black line
     next_bar_x = None
     start_x = bar_center_x + 1  # Start after the current bar
 
-    for x in range(start_x, width):
-        if img_array[bar_top, x] < BLACK_THRESHOLD:
-            next_bar_x = x
-            break
+    is_black = img_array[bar_top, start_x:] < BLACK_THRESHOLD
+    if is_black.any():
+        next_bar_x = start_x + int(np.argmax(is_black))
 
     if next_bar_x is None:
         return {
@@ -132,42 +136,37 @@ def find_component_area(filepath):
     }
 
 
-def export_area_to_analyze(filepath, area, output_path):
-    img = Image.open(filepath)
-
+def export_area_to_analyze(img, area, output_path=None):
     # {'x_start': 225, 'x_end': 997, 'y_start': 320, 'y_end': 2103}
-    print(area)
-
     crop_box = (area['x_start'], area['y_start'], area['x_end'], area['y_end'])
 
     cropped = img.crop(crop_box)
 
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    cropped.save(output_path, 'JPEG', quality=95)
+    # Only write the crop to disk when asked to, e.g. for debugging
+    if output_path is not None:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        cropped.save(output_path, 'JPEG', quality=95)
 
     # print(f'Saved cropped component → {output_path}')
     # print(f'Size: {cropped.width} × {cropped.height} pixels')
 
+    return cropped
+
 
 def find_non_white_at_fraction(
-    image_path, x_fraction=1 / 10, intensity_threshold=250, merge_threshold=5
+    image, x_fraction=1 / 10, intensity_threshold=250, merge_threshold=5
 ):
     """Find y coordinates with non-white content at a fractional x position."""
-    img_array = np.array(Image.open(image_path).convert('L'))
-
-    img = Image.open(image_path).convert('L')
-    img_array = np.array(img)
+    img_array = _as_gray_array(image)
     height, width = img_array.shape
 
     x = 5
     antiX = width - 5
-    non_white_ys = np.where(img_array[:, x] < intensity_threshold)[0]
-    non_white_ys_rev = np.where(img_array[:, antiX] < intensity_threshold)[0]
 
-    combined_non_whites = np.unique(np.concatenate((non_white_ys, non_white_ys_rev)))
-    non_white_ys = combined_non_whites  # use combined results for downstream processing
-
-    print(non_white_ys)
+    # Gather both probe columns in one slice and keep the rows that are
+    # non-white in either, already sorted and unique
+    columns = img_array[:, [x, antiX]] < intensity_threshold
+    non_white_ys = np.flatnonzero(columns.any(axis=1))
 
     if non_white_ys.size == 0:
         return x, np.array([], dtype=int)
@@ -178,14 +177,13 @@ def find_non_white_at_fraction(
     # Find indices where gap > merge_threshold → these mark new clusters
     split_points = np.where(gaps > merge_threshold)[0] + 1
 
-    # Split the array into clusters and take the first element of each
-    clusters = np.split(non_white_ys, split_points)
-    selected_ys = np.array([cluster[0] for cluster in clusters], dtype=int)
+    # Take the first element of each cluster, without splitting into subarrays
+    selected_ys = non_white_ys[np.concatenate(([0], split_points))].astype(int)
 
     return x, selected_ys
 
 
-def extract_components(lines, image_path):
+def extract_components(lines, image):
     # Extract just the y-coordinates array from the tuple
     y_coordinates = lines[1]  # lines[1] contains the array of y-coordinates
 
@@ -198,27 +196,75 @@ def extract_components(lines, image_path):
 
     half_height = average_distance / 3
 
-    img_array = np.array(Image.open(image_path).convert('L'))
-    height, width = img_array.shape
+    # Only the page width is needed, so a PIL image is not converted to pixels
+    if isinstance(image, np.ndarray):
+        width = image.shape[1]
+    else:
+        width = image.width
 
-    component_areas = []
-    for i, y_center in enumerate(y_coordinates):
-        component_area = {
-            'x_start': 0,
-            'x_end': width,
-            'y_start': int(y_center - half_height),
-            'y_end': int(y_center + half_height),
-        }
-        component_areas.append(component_area)
-        # print(f'Component {i + 1}: {component_area}')
+    # A single row has no distance to its neighbours to size it by
+    if len(y_coordinates) and np.isnan(half_height):
+        raise ValueError('Need at least two component rows to size the components')
+
+    # One (x_start, y_start, x_end, y_end) row per component, in PIL crop box
+    # order, truncated towards zero like int()
+    component_areas = np.empty((len(y_coordinates), 4), dtype=np.int32)
+    component_areas[:, 0] = 0
+    component_areas[:, 1] = y_coordinates - half_height
+    component_areas[:, 2] = width
+    component_areas[:, 3] = y_coordinates + half_height
 
     # print(f'\nTotal components: {len(component_areas)}')
 
     return (component_areas, half_height)
 
 
-def find_suoja_cell_start_and_end(crop_offset, y_pos, original_image_path):
-    img = Image.open(original_image_path)
+def _find_bar_positions(is_black, min_gap=10):
+    # A black pixel more than min_gap pixels past the previous bar (or past
+    # x = 0) starts a new bar. Only the black pixels are visited, jumping
+    # straight to the first one past the gap.
+    black_xs = np.flatnonzero(is_black)
+
+    bars_positions = []
+    cursor = 0
+    while True:
+        i = np.searchsorted(black_xs, cursor + min_gap + 1)
+        if i == black_xs.size:
+            return bars_positions
+        cursor = int(black_xs[i])
+        bars_positions.append(cursor)
+
+
+def _read_header(header_crop, header_pixels):
+    key = hashlib.blake2b(header_pixels.tobytes(), digest_size=16).digest()
+    key = (header_pixels.shape, key)
+
+    # Streamlit sessions share the memo from their own threads. The lock is
+    # not held while tesseract runs.
+    with _header_cache_lock:
+        ocr_data = _header_cache.get(key)
+        if ocr_data is not None:
+            _header_cache.move_to_end(key)
+            return ocr_data
+
+    # Imported on first use, like the OCR backends, so importing this module
+    # does not load pytesseract
+    import pytesseract
+
+    ocr_data = pytesseract.image_to_data(
+        header_crop, output_type=pytesseract.Output.DICT
+    )
+    with _header_cache_lock:
+        _header_cache[key] = ocr_data
+        if len(_header_cache) > _HEADER_CACHE_SIZE:
+            _header_cache.popitem(last=False)
+    return ocr_data
+
+
+def find_suoja_cell_start_and_end(crop_offset, y_pos, original_image, gray=None):
+    img = original_image
+    # Grayscale pixels of the page, unless the caller already has them
+    img_array = _as_gray_array(img) if gray is None else gray
 
     # Search for "Suoja" in the header area (at the top of the full image)
     header_y_start = 0  # Start from the top of the image
@@ -230,9 +276,7 @@ def find_suoja_cell_start_and_end(crop_offset, y_pos, original_image_path):
     header_crop = img.crop((header_x_start, header_y_start, header_x_end, header_y_end))
 
     # Use pytesseract to get detailed word-level data with bounding boxes
-    ocr_data = pytesseract.image_to_data(
-        header_crop, output_type=pytesseract.Output.DICT
-    )
+    ocr_data = _read_header(header_crop, img_array[header_y_start:header_y_end])
 
     # Find the word "Suoja" and get its x-coordinates
     suoja_left = None
@@ -269,19 +313,10 @@ def find_suoja_cell_start_and_end(crop_offset, y_pos, original_image_path):
         BLACK_THRESHOLD = 100
         start_x = crop_offset[0]
         start_y = crop_offset[1] + y_pos
-        img_array = np.array(img.convert('L'))
         row = img_array[start_y, start_x:]
-        row_width = img.width - start_x
         is_black = row < BLACK_THRESHOLD
 
-        cursor = 0
-        bars_positions = []
-
-        for x in range(row_width):
-            if is_black[x] and x - cursor > 10:
-                cursor = x
-                true_position = x + crop_offset[0]
-                bars_positions.append(true_position)
+        bars_positions = [x + crop_offset[0] for x in _find_bar_positions(is_black)]
 
         if len(bars_positions) >= 3:
             suoja_start = bars_positions[1]
@@ -293,17 +328,11 @@ def find_suoja_cell_start_and_end(crop_offset, y_pos, original_image_path):
         # Now find the vertical bars (column separators) closest to these x-coordinates
         BLACK_THRESHOLD = 100
         start_y = crop_offset[1] + y_pos
-        img_array = np.array(img.convert('L'))
         row = img_array[start_y, :]
         is_black = row < BLACK_THRESHOLD
 
         # Find all vertical bars
-        cursor = 0
-        bars_positions = []
-        for x in range(img.width):
-            if is_black[x] and x - cursor > 10:
-                cursor = x
-                bars_positions.append(x)
+        bars_positions = _find_bar_positions(is_black)
 
         # Find the bars that bound the Suoja column
         # The start bar should be just before suoja_left
@@ -323,42 +352,53 @@ def find_suoja_cell_start_and_end(crop_offset, y_pos, original_image_path):
     return tuple((suoja_start, suoja_end))
 
 
+def _save_component(cropped, output_path):
+    cropped.save(output_path, 'JPEG', quality=95)
+
+
 def save_components_to_folder(
-    input_path,
+    input_image,
     component_areas,
-    original_image_path,
+    original_image,
     crop_offset,
     output_folder='components',
+    original_gray=None,
 ):
-    # Create the output folder if it doesn't exist
-    os.makedirs(output_folder, exist_ok=True)
+    # With no output folder the components are only kept in memory
+    if output_folder is not None:
+        os.makedirs(output_folder, exist_ok=True)
 
-    # Open the source image
-    img = Image.open(input_path)
+    img = input_image
 
     cropped_images = []
 
     # get suoja start and end boundaries
-    component_center_y = component_areas[0]['y_end']
+    component_center_y = int(component_areas[0, 3])
     suoja_edges = find_suoja_cell_start_and_end(
-        crop_offset, component_center_y, original_image_path
+        crop_offset, component_center_y, original_image, original_gray
     )
 
     component_with_suoja: Dict[Image, str] = {}
 
-    # Save each component
-    for i, area in enumerate(component_areas, start=1):
-        # print(area)
-        crop_box = (area['x_start'], area['y_start'], area['x_end'], area['y_end'])
+    crop_boxes = [tuple(box) for box in component_areas.tolist()]
 
-        suoja_area = {
+    suoja_areas = [
+        {
             'x_start': suoja_edges[0],
             'x_end': suoja_edges[1],
-            'y_start': area['y_start'] + crop_offset[1] - 25,
-            'y_end': area['y_end'] + crop_offset[1],
+            'y_start': y_start + crop_offset[1] - 25,
+            'y_end': y_end + crop_offset[1],
         }
+        for _, y_start, _, y_end in crop_boxes
+    ]
+
+    # OCR the suoja cells of the whole page in one batch
+    suoja_values = ocr_read_areas(original_image, suoja_areas)
+
+    # Save each component
+    for i, (crop_box, suoja_value) in enumerate(zip(crop_boxes, suoja_values), start=1):
+        # print(crop_box)
 
-        suoja_value = ocr_read_area(original_image_path, suoja_area)
         # Normalize suoja value to extract only the part after the slash
         suoja_value = normalize_suoja_value(suoja_value)
 
@@ -366,10 +406,17 @@ def save_components_to_folder(
         cropped_images.append(cropped)
 
         # Save with numbered filename
-        output_path = os.path.join(output_folder, f'component_{i:02d}.jpg')
-        cropped.save(output_path, 'JPEG', quality=95)
+        output_path = f'component_{i:02d}.jpg'
+        if output_folder is not None:
+            output_path = os.path.join(output_folder, output_path)
 
         component_with_suoja[output_path] = suoja_value
+
+    if output_folder is not None:
+        # JPEG encoding releases the GIL, so threads overlap the encoding and
+        # the file writes of the components
+        with ThreadPoolExecutor(max_workers=_SAVE_WORKERS) as executor:
+            list(executor.map(_save_component, cropped_images, component_with_suoja))
         # print(
         #     f'Saved: {output_path} (size: {cropped.size[0]} × {cropped.size[1]} pixels)'
         # )
@@ -380,13 +427,47 @@ def save_components_to_folder(
     return tuple((cropped_images, component_with_suoja))
 
 
-def do_extraction(image_path, out_dir='extracted_cells'):
-    area = find_component_area(image_path)
+@lru_cache(maxsize=4)
+def _load_gray(path, mtime):
+    # Pages run through the pipeline again (e.g. while tuning) are decoded
+    # once. Only the last few pages are kept, so batch runs over many pages
+    # do not hold every page in memory. mtime is part of the key so a
+    # rewritten file is decoded again.
+    image = Image.open(path)
+    image.draft('L', image.size)
+    return image.convert('L')
+
+
+def do_extraction(image, out_dir=None, components_dir='components'):
+    # Accept a rendered page (PIL image or grayscale array) as well as a path
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    elif not isinstance(image, Image.Image):
+        image = _load_gray(image, os.path.getmtime(image))
+    image.load()
+
+    # Every step only looks at luminance, so a colour page is converted once
+    # here instead of separately by each step
+    if image.mode != 'L':
+        image = image.convert('L')
+
+    # Decode the pixels once, the helpers below share these arrays
+    gray = np.asarray(image)
+
+    area = find_component_area(gray)
     crop_offset = tuple((area['x_start'] + area['x_end'], area['y_start']))
-    output_path = os.path.join(out_dir, 'extracted_components.jpg')
-    export_area_to_analyze(image_path, area, output_path)
-    lines = find_non_white_at_fraction(output_path)
-    component_areas, half_height = extract_components(lines, output_path)
+    output_path = None
+    if out_dir is not None:
+        output_path = os.path.join(out_dir, 'extracted_components.jpg')
+    component_image = export_area_to_analyze(image, area, output_path)
+    component_gray = np.asarray(component_image)
+    lines = find_non_white_at_fraction(component_gray)
+    component_areas, half_height = extract_components(lines, component_gray)
     return save_components_to_folder(
-        output_path, component_areas, image_path, crop_offset
+        component_image,
+        component_areas,
+        image,
+        crop_offset,
+        components_dir,
+        original_gray=gray,
     )
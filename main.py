@@ -1,8 +1,39 @@
 from pdf_to_jpeg import convert_pdf_to_images
 from extract_components import do_extraction
 from make_comparisons import compare_components
+from OCR import set_ocr_workers
+from concurrent.futures import ProcessPoolExecutor
 import os
-import glob
+import re
+
+PAGE_FILE_PATTERN = re.compile(r'page_(\d+)\.jpg')
+# Components of each page are saved in a page_N folder under this one
+COMPONENTS_DIR = 'components'
+
+
+def find_page_files(pages_dir):
+    # One directory listing, sorted by page number so page_10 comes after page_9
+    if not os.path.isdir(pages_dir):
+        return []
+
+    page_files = [
+        (int(match.group(1)), entry.path)
+        for entry in os.scandir(pages_dir)
+        if (match := PAGE_FILE_PATTERN.fullmatch(entry.name))
+    ]
+    return [path for _, path in sorted(page_files)]
+
+
+def process_page(page_file):
+    # Each page saves its components in its own folder, so pages processed in
+    # parallel do not overwrite each other's files
+    page_name = os.path.splitext(os.path.basename(page_file))[0]
+    components_dir = os.path.join(COMPONENTS_DIR, page_name)
+
+    (cell_images, component_with_suoja) = do_extraction(
+        page_file, components_dir=components_dir
+    )
+    return len(cell_images), component_with_suoja
 
 
 def main():
@@ -10,7 +41,7 @@ def main():
     convert_pdf_to_images('example.pdf')
 
     print('\nExtracting cells and suoja values from each page...')
-    page_files = sorted(glob.glob(os.path.join('pages', 'page_*.jpg')))
+    page_files = find_page_files('pages')
 
     if not page_files:
         print('No page files found in pages dir')
@@ -19,13 +50,22 @@ def main():
     total_cells = 0
     all_component_with_suoja = {}
 
-    for page_file in page_files:
+    # Pages are independent, process them in parallel unless there is just one
+    max_workers = min(os.cpu_count() or 1, len(page_files))
+    if max_workers <= 1:
+        results = [process_page(page_file) for page_file in page_files]
+    else:
+        # The page workers already use the cores, so each reads its own page's
+        # suoja cells without starting OCR workers of its own
+        with ProcessPoolExecutor(
+            max_workers=max_workers, initializer=set_ocr_workers, initargs=(1,)
+        ) as executor:
+            results = list(executor.map(process_page, page_files))
+
+    for page_file, (num_cells, component_with_suoja) in zip(page_files, results):
         page_name = os.path.basename(page_file)
 
-        print(f'\nProcessing {page_name}...')
-
-        (cell_images, component_with_suoja) = do_extraction(page_file)
-        num_cells = len(cell_images)
+        print(f'\n{page_name}:')
         print(f'  Extracted {num_cells} cells from {page_name}')
         print(f'  Found {len(component_with_suoja)} components with suoja values')
 
@@ -52,7 +92,9 @@ def main():
             key=lambda x: x[1],
             reverse=True,
         ):
-            print(f'\nComponent: {os.path.basename(filename)}')
+            # Relative to the components folder, e.g. page_3/component_01.jpg,
+            # since every page numbers its components from 01
+            print(f'\nComponent: {os.path.relpath(filename, COMPONENTS_DIR)}')
             print(f'  Suoja value: {label}')
             print(f'  Count: {count}')
 
@@ -1,78 +1,56 @@
-from typing import Dict, Tuple
-from compare import are_images_different
-from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from collections import defaultdict
+import numpy as np
+from PIL import Image
+from compare import MAX_HASH_DIFF, hash_distances, image_hash
 
 
 def compare_components(
     component_with_suoja: Dict[str, str],
+    cell_images: Optional[List[Image.Image]] = None,
 ) -> Dict[Tuple[str, str], int]:
+    # cell_images, when given, are the component images in the same order as
+    # component_with_suoja and are hashed in memory instead of read from disk
     found_components: Dict[Tuple[str, str], int] = {}
-    dir_path = Path('components')
 
-    for component_path, suoja_value in component_with_suoja.items():
-        if len(found_components) == 0:
-            found_components[(component_path, suoja_value)] = 1
-            continue
+    paths = list(component_with_suoja)
+    if not paths:
+        return found_components
 
-        is_new = True
-        for component_key in list(found_components.keys()):
-            unique_filename, unique_suoja = component_key
+    # Components with different suoja values are never the same component, so
+    # only components sharing a suoja value are compared with each other
+    buckets: Dict[str, List[int]] = defaultdict(list)
+    for i, suoja_value in enumerate(component_with_suoja.values()):
+        buckets[suoja_value].append(i)
 
-            if suoja_value != unique_suoja:
-                continue
+    # Hash every component once and compare each bucket's pairs in one go
+    images = paths if cell_images is None else cell_images
+    hashes = np.stack([image_hash(image) for image in images])
+    different = {}
+    position = {}
+    for suoja_value, indices in buckets.items():
+        different[suoja_value] = hash_distances(hashes[indices]) > MAX_HASH_DIFF
+        position.update((i, k) for k, i in enumerate(indices))
 
-            images_different = are_images_different(component_path, unique_filename)
+    # Bucket positions of the first component of each unique (image, suoja) group
+    unique_positions: Dict[str, List[int]] = defaultdict(list)
 
-            images_similar = not images_different
+    for i, (component_path, suoja_value) in enumerate(component_with_suoja.items()):
+        k = position[i]
+        bucket_different = different[suoja_value]
+
+        is_new = True
+        for u in unique_positions[suoja_value]:
+            images_similar = not bucket_different[k, u]
 
             if images_similar:
-                found_components[(unique_filename, unique_suoja)] += 1
+                unique_filename = paths[buckets[suoja_value][u]]
+                found_components[(unique_filename, suoja_value)] += 1
                 is_new = False
                 break
 
         if is_new:
+            unique_positions[suoja_value].append(k)
             found_components[(component_path, suoja_value)] = 1
 
-    # dir_path = Path(cells_dir)
-
-    # sorted_files = sorted(dir_path.iterdir())
-
-    # for idx, file_path in enumerate(sorted_files):
-    #     if not file_path.is_file():
-    #         continue
-
-    #     if idx >= len(suojas):
-    #         break
-
-    #     filename = file_path.name
-    #     suoja = suojas[idx]
-
-    #     # First component is always unique
-    #     if len(found_components) == 0:
-    #         found_components[(filename, suoja)] = 1
-    #         continue
-
-    #     # Check if this component matches any existing unique component
-    #     is_new = True
-    #     for component_key in list(found_components.keys()):
-    #         unique_filename, unique_suoja = component_key
-
-    #         if suoja != unique_suoja:
-    #             continue
-
-    #         images_different = are_images_different(
-    #             str(file_path), str(dir_path / unique_filename)
-    #         )
-    #         images_similar = not images_different
-
-    #         # If both suoja and image match, it's a duplicate
-    #         if images_similar:
-    #             is_new = False
-    #             found_components[component_key] += 1
-    #             break
-
-    #     # Add as new unique component if no match found
-    #     if is_new:
-    #         found_components[(filename, suoja)] = 1
-
     return found_components
@@ -1,8 +1,21 @@
 from pdf2image import convert_from_path
+import pypdfium2 as pdfium
+import numpy as np
 import os
+import threading
+from functools import lru_cache
 from typing import Optional, List
 from PIL import Image
 
+# Pages are rendered at the resolution the extraction is calibrated for: bar
+# widths, margins and the suoja column offsets in extract_components are pixel
+# values at 300 DPI. Display thumbnails are downscaled from this render.
+EXTRACTION_DPI = 300
+
+# pdfium is not thread safe and pypdfium2 does not lock it, so every call into
+# it from this module holds this lock
+_pdfium_lock = threading.Lock()
+
 
 def convert_pdf_to_images(
     pdf_path: str,
@@ -11,6 +24,7 @@ def convert_pdf_to_images(
     dpi: int = 300,
     poppler_path: Optional[str] = '/opt/homebrew/bin',
     return_images: bool = False,
+    thread_count: Optional[int] = None,
 ) -> Optional[List[Image.Image]]:
     if not return_images:
         os.makedirs(output_dir, exist_ok=True)
@@ -35,6 +49,8 @@ def convert_pdf_to_images(
         first_page=first_page,
         last_page=last_page,
         dpi=dpi,
+        # Split the pages between several pdftoppm processes, one per core
+        thread_count=thread_count or os.cpu_count() or 1,
     )
 
     # Filter to specific pages if needed
@@ -61,3 +77,50 @@ def convert_pdf_to_images(
         print(f'Saved {output_path}')
 
     return None
+
+
+def render_pdf_page(
+    pdf: pdfium.PdfDocument,
+    page_number: int,
+    dpi: int = EXTRACTION_DPI,
+) -> np.ndarray:
+    # Render a single page (1-based) straight to a grayscale uint8 array, no files
+    # involved. The extraction only needs luminance, so this is a third of the
+    # bytes of an RGB render.
+    page = pdf[page_number - 1]
+    try:
+        bitmap = page.render(scale=dpi / 72, grayscale=True)
+        return np.ascontiguousarray(bitmap.to_numpy())
+    finally:
+        page.close()
+
+
+def count_pdf_pages(pdf_path: str) -> int:
+    # The document is closed right away, pages are rendered from the path
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+
+@lru_cache(maxsize=4)
+def _open_pdf(pdf_path, mtime):
+    # Documents stay open in the process that renders them, so turning pages
+    # does not parse the file's cross-reference table again. mtime is part of
+    # the key so a rewritten file is opened again; evicted documents are
+    # closed by pypdfium2 when they are garbage collected.
+    return pdfium.PdfDocument(pdf_path)
+
+
+def render_pdf_page_from_path(
+    pdf_path: str,
+    page_number: int,
+    dpi: int = EXTRACTION_DPI,
+) -> np.ndarray:
+    # Uses its own documents so it can run in a worker process; pdfium
+    # handles must not be shared between processes
+    with _pdfium_lock:
+        pdf = _open_pdf(pdf_path, os.path.getmtime(pdf_path))
+        return render_pdf_page(pdf, page_number, dpi=dpi)
@@ -5,6 +5,10 @@ import os
 from typing import List, Optional, Union
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from OCR import read_text_line
+
+# Protection IDs only use these characters
+SUOJA_WHITELIST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
 
 
 def _find_suoja_column_bounds(width):
@@ -33,8 +37,11 @@ def extract_suoja_numbers(image_path, save_crops=False, output_folder='suoja_ext
     if save_crops:
         os.makedirs(output_folder, exist_ok=True)
 
+    # Only luminance is used, so JPEGs are decoded straight to grayscale
     img = Image.open(image_path)
-    img_array = np.array(img.convert('L'))
+    img.draft('L', img.size)
+    img = img.convert('L')
+    img_array = np.asarray(img)
     height, width = img_array.shape
 
     # Find Suoja column boundaries
@@ -125,20 +132,20 @@ def _preprocess_for_ocr(cropped_img):
 
 def _try_ocr(cropped_img, config: Optional[str] = None):
     try:
-        import pytesseract
-
         # Preprocess image for better accuracy
         processed_img = _preprocess_for_ocr(cropped_img)
 
-        # Use default config if none provided
         if config is None:
-            config = '--psm 7 --oem 3 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+            # Single-line alphanumeric text, read with the Tesseract instance
+            # kept loaded in this process instead of a tesseract subprocess
+            text = read_text_line(processed_img, SUOJA_WHITELIST)
+        else:
+            import pytesseract
 
-        # Use more aggressive OCR settings for single-line alphanumeric text
-        text = pytesseract.image_to_string(
-            processed_img,
-            config=config,
-        ).strip()
+            text = pytesseract.image_to_string(
+                processed_img,
+                config=config,
+            ).strip()
 
         # Clean up the text
         cleaned = text.replace(' ', '').replace('\n', '').replace('\r', '')
@@ -177,7 +184,8 @@ def extract_suoja_values_from_image(
         if max_workers is None:
             max_workers = min(len(regions), os.cpu_count() or 4)
 
-        # Use ThreadPoolExecutor (pytesseract releases GIL)
+        # OpenCV and tesserocr release the GIL, and each thread reads with its
+        # own Tesseract instance, so the crops are read in parallel
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
             results = list(executor.map(_try_ocr_batch_worker, regions))
 